@@ -1,82 +1,83 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
 import os
+import sys
 
-# ---------- load daily data ----------
-# Use proper path handling
-data_path = Path(__file__).parent.parent / "data" / "dax_daily.csv"
-if not data_path.exists():
-    raise FileNotFoundError(f"Data file not found: {data_path}")
+sys.path.append(str(Path(__file__).parent))
+from utils import load_prices, save_plot
 
-df = pd.read_csv(data_path)                       # 1) plain read
-df['Date'] = pd.to_datetime(df['Date'])           # 2) force datetime
-df.set_index('Date', inplace=True)                # 3) make it the index
-prices = df['Close']                              # 4) grab the series
+# ---------- load daily data ----------
+close, dates = load_prices()                      # cached parse of data/dax_daily.csv
 
 # ---------- strategy ----------
-ret = prices.pct_change().fillna(0)
-signal = (ret.rolling(3).sum() > 0).astype(int)      # last 3 days up?
-pos = signal.shift(1).fillna(0)                      # trade next day
+p = close                                             # float32 from load_prices
+ret = np.empty_like(p)                                # daily returns, 0 on day one
+ret[0] = 0.0
+np.divide(p[1:], p[:-1], out=ret[1:])
+ret[1:] -= 1.0
+np.nan_to_num(ret, copy=False, nan=0.0, posinf=0.0, neginf=0.0)  # missing close = flat day
+csum = np.cumsum(ret)                                 # 3-day sums from prefix sums
+signal = np.zeros(len(p), dtype=np.int8)
+signal[2:] = csum[2:] - np.concatenate(([0.0], csum[:-3])) > 0  # last 3 days up?
+pos = np.empty_like(signal)                           # trade next day
+pos[0] = 0
+pos[1:] = signal[:-1]
 fee = 0.0001                                          # 1 bp
-strategy_ret = pos * ret - fee * pos.diff().abs().fillna(0)
+strategy_ret = pos * ret - fee * np.abs(np.diff(pos, prepend=0))
 
 # ---------- metrics ----------
 ann = 252                                             # trading days/yr
 
+# Metrics run on the raw ndarray; pandas is only used for the plots
+arr = strategy_ret
+std = arr.std(ddof=1, dtype=np.float64)               # same estimator as Series.std()
+
 # Add error handling for calculations
-if strategy_ret.std() == 0:
+if std == 0:
     sharpe = 0.0
     print("Warning: Strategy returns have zero volatility")
 else:
-    sharpe = (strategy_ret.mean() / strategy_ret.std()) * np.sqrt(ann)
+    sharpe = (arr.mean(dtype=np.float64) / std) * np.sqrt(ann)
 
-equity = (1 + strategy_ret).cumprod()
-if len(strategy_ret) == 0:
+log_equity = np.cumsum(np.log1p(arr, dtype=np.float64))  # compound in log space
+equity_arr = np.exp(log_equity)
+if len(arr) == 0:
     cagr = 0.0
     print("Warning: No strategy returns available")
 else:
-    cagr = equity.iloc[-1] ** (ann / len(strategy_ret)) - 1
+    cagr = equity_arr[-1] ** (ann / len(arr)) - 1
 
-mdd = (equity / equity.cummax() - 1).min()
+# Running peak and drawdown are computed once, for both MaxDD and the plot
+drawdown_arr = np.expm1(log_equity - np.maximum.accumulate(log_equity))
+mdd = drawdown_arr.min()
 
 print(f"CAGR   {cagr:.2%}")
 print(f"Sharpe {sharpe:.2f}")
 print(f"MaxDD  {mdd:.2%}")
 
 # ---------- plots ----------
+equity = pd.Series(equity_arr, index=dates)
 fig_path = Path(__file__).parent.parent / "fig"
 fig_path.mkdir(exist_ok=True)
 
 # Equity curve
-plt.figure(figsize=(10, 6))
-equity.plot(title="Equity Curve")
-plt.grid(True, alpha=0.3)
-plt.savefig(fig_path / "equity.png", dpi=300, bbox_inches='tight')
-plt.close()
+with save_plot(fig_path / "equity.png", "Equity Curve") as ax:
+    ax.plot(equity)
 
 # Trade return histogram (only if we have trades)
-trade_returns = strategy_ret[strategy_ret != 0]
-if len(trade_returns) > 0:
-    plt.figure(figsize=(10, 6))
-    trade_returns.hist(bins=40)
-    plt.title("Trade Return Histogram")
-    plt.xlabel("Return")
-    plt.ylabel("Frequency")
-    plt.grid(True, alpha=0.3)
-    plt.savefig(fig_path / "hist.png", dpi=300, bbox_inches='tight')
-    plt.close()
+trade_returns = arr[arr != 0.0]
+if trade_returns.size:
+    bins = np.linspace(trade_returns.min(), trade_returns.max(), 41)
+    with save_plot(fig_path / "hist.png", "Trade Return Histogram",
+                   xlabel="Return", ylabel="Frequency") as ax:
+        ax.hist(trade_returns, bins=bins)
 else:
     print("Warning: No trades to plot in histogram")
 
 # Drawdown plot
-plt.figure(figsize=(10, 6))
-drawdown = (equity / equity.cummax()) - 1
-drawdown.plot(title="Drawdown")
-plt.ylabel("Drawdown")
-plt.grid(True, alpha=0.3)
-plt.savefig(fig_path / "drawdown.png", dpi=300, bbox_inches='tight')
-plt.close()
+drawdown = pd.Series(drawdown_arr, index=dates)
+with save_plot(fig_path / "drawdown.png", "Drawdown", ylabel="Drawdown") as ax:
+    ax.plot(drawdown)
 
 print(f"Plots saved to: {fig_path}")
@@ -4,15 +4,102 @@ Command-line interface for momentum backtesting with parameter sweep capability.
 """
 
 import argparse
+import itertools
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from pathlib import Path
 import sys
 import os
 
 # Add src directory to path to import utils
 sys.path.append(str(Path(__file__).parent))
-from utils import momentum_backtest
+from utils import HAVE_NUMBA, Scratch, load_prices, momentum_backtest, momentum_sweep, save_plot
+
+
+def parse_list(value, cast):
+    """Parse a comma-separated argument such as "1,3,5,10" into a list."""
+    try:
+        return [cast(v) for v in value.split(',') if v.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid list: {value!r}")
+
+
+def run_points(prices, combos):
+    """
+    Backtest a batch of (window, fee) combinations and return their metrics.
+
+    One set of Scratch buffers is allocated per batch and reused for every
+    combination in it.
+    """
+    scratch = Scratch.empty(len(prices), dtype=prices.dtype)
+    rows = []
+    for window, fee in combos:
+        results = momentum_backtest(prices, window, fee, out=scratch)
+        rows.append({
+            'window': window,
+            'fee': fee,
+            'cagr': results['cagr'],
+            'sharpe': results['sharpe'],
+            'max_dd': results['max_dd'],
+        })
+    return rows
+
+
+def run_sweep(prices, windows, fees):
+    """
+    Backtest every (window, fee) combination on already-loaded prices.
+
+    With numba, each fee is one call to the thread-parallel
+    momentum_sweep batch kernel. Otherwise combinations are split into
+    one batch per worker of a joblib process pool when joblib is
+    installed, or run serially.
+    """
+    values = prices.view()
+    values.flags.writeable = False  # shared read-only with the workers
+
+    if HAVE_NUMBA:
+        metrics = {fee: momentum_sweep(values, windows, fee) for fee in fees}
+        rows = [
+            {
+                'window': window,
+                'fee': fee,
+                'cagr': metrics[fee][1][i],
+                'sharpe': metrics[fee][0][i],
+                'max_dd': metrics[fee][2][i],
+            }
+            for i, window in enumerate(windows)
+            for fee in fees
+        ]
+        return pd.DataFrame(rows)
+
+    combos = list(itertools.product(windows, fees))
+    try:
+        from joblib import Parallel, delayed, effective_n_jobs
+    except ImportError:
+        print("joblib not installed, running sweep serially")
+        rows = run_points(values, combos)
+    else:
+        # Contiguous batches keep the rows in sweep order
+        size = -(-len(combos) // effective_n_jobs(-1))
+        batches = [combos[i:i + size] for i in range(0, len(combos), size)]
+        rows = [
+            row
+            for batch in Parallel(n_jobs=len(batches), backend='loky')(
+                delayed(run_points)(values, batch) for batch in batches
+            )
+            for row in batch
+        ]
+
+    return pd.DataFrame(rows)
+
+
+def plot_equity(equity, window, fig_path, dpi=300):
+    """Save the equity curve for one backtest to fig/equity_w<window>.png."""
+    equity_file = fig_path / f"equity_w{window}.png"
+    with save_plot(equity_file, f"Equity Curve (Window: {window} days)",
+                   figsize=(12, 6), dpi=dpi, xlabel='Date', ylabel='Equity') as ax:
+        ax.plot(equity)
+    print(f"Saved equity curve: {equity_file}")
 
 
 def main():
@@ -31,36 +118,73 @@ def main():
         default=0.0001,
         help='Transaction fee as decimal (default: 0.0001 = 1bp)'
     )
+    parser.add_argument(
+        '--windows',
+        type=lambda v: parse_list(v, int),
+        help='Comma-separated lookback windows to sweep, e.g. "1,3,5,10"'
+    )
+    parser.add_argument(
+        '--fees',
+        type=lambda v: parse_list(v, float),
+        help='Comma-separated fees to sweep, e.g. "0,1e-4"'
+    )
+    parser.add_argument(
+        '--no-plots',
+        action='store_true',
+        help='Only print metrics, skip writing plots'
+    )
     
     args = parser.parse_args()
     
+    # Sweep mode whenever a list of windows or fees is given
+    sweep = args.windows is not None or args.fees is not None
+    windows = args.windows or [args.window]
+    fees = args.fees or [args.fee]
+
     # Validate arguments
-    if args.window <= 0:
+    if not windows or min(windows) <= 0:
         print("Error: Window must be positive")
         sys.exit(1)
     
-    if args.fee < 0:
+    if not fees or min(fees) < 0:
         print("Error: Fee cannot be negative")
         sys.exit(1)
     
     try:
         # Load data
-        data_path = Path(__file__).parent.parent / "data" / "dax_daily.csv"
-        if not data_path.exists():
-            print(f"Error: Data file not found: {data_path}")
-            sys.exit(1)
+        print("Loading data")
+        close, dates = load_prices()
+        
+        print(f"Loaded {len(close)} price points from {dates[0].strftime('%Y-%m-%d')} to {dates[-1].strftime('%Y-%m-%d')}")
         
-        print(f"Loading data from {data_path}")
-        df = pd.read_csv(data_path)
-        df['Date'] = pd.to_datetime(df['Date'])
-        df.set_index('Date', inplace=True)
-        prices = df['Close']
+        # Create figures directory
+        fig_path = Path(__file__).parent.parent / "fig"
+        if not args.no_plots:
+            fig_path.mkdir(exist_ok=True)
         
-        print(f"Loaded {len(prices)} price points from {prices.index[0].strftime('%Y-%m-%d')} to {prices.index[-1].strftime('%Y-%m-%d')}")
+        if sweep:
+            print(f"\nSweeping {len(windows)} windows x {len(fees)} fees...")
+            table = run_sweep(close, windows, fees)
+            
+            results_file = Path(__file__).parent.parent / "sweep_results.csv"
+            table.to_csv(results_file, index=False)
+            print(f"\n{table.to_string(index=False)}")
+            print(f"\nSaved sweep results: {results_file}")
+            
+            # Only the best configuration gets a plot
+            best = table.loc[table['sharpe'].idxmax()]
+            window, fee = int(best['window']), float(best['fee'])
+            print(f"Best Sharpe {best['sharpe']:.2f} (window {window}, fee {fee:.4f})")
+            if not args.no_plots:
+                best_run = momentum_backtest(close, window, fee, index=dates)
+                plot_equity(best_run['equity'], window, fig_path, dpi=150)
+            return
         
         # Run backtest
         print(f"\nRunning momentum backtest with {args.window}-day window and {args.fee:.4f} fee...")
-        results = momentum_backtest(prices, args.window, args.fee)
+        # Metrics are index-free; dates are only attached for the plots
+        results = momentum_backtest(close, args.window, args.fee,
+                                    index=None if args.no_plots else dates)
         
         # Print metrics
         print(f"\n{'='*50}")
@@ -71,51 +195,35 @@ def main():
         print(f"MaxDD     {results['max_dd']:.2%}")
         print(f"{'='*50}")
         
-        # Create figures directory
-        fig_path = Path(__file__).parent.parent / "fig"
-        fig_path.mkdir(exist_ok=True)
+        if args.no_plots:
+            return
         
         # Generate plots with window in filename
         window_suffix = f"_w{args.window}"
         
         # Equity curve
-        plt.figure(figsize=(12, 6))
-        results['equity'].plot(title=f"Equity Curve (Window: {args.window} days)")
-        plt.grid(True, alpha=0.3)
-        plt.ylabel('Equity')
-        plt.xlabel('Date')
-        equity_file = fig_path / f"equity{window_suffix}.png"
-        plt.savefig(equity_file, dpi=300, bbox_inches='tight')
-        plt.close()
-        print(f"Saved equity curve: {equity_file}")
+        plot_equity(results['equity'], args.window, fig_path)
         
         # Trade return histogram
-        trade_returns = results['returns'][results['returns'] != 0]
-        if len(trade_returns) > 0:
-            plt.figure(figsize=(10, 6))
-            trade_returns.hist(bins=40, alpha=0.7)
-            plt.title(f"Trade Return Histogram (Window: {args.window} days)")
-            plt.xlabel("Return")
-            plt.ylabel("Frequency")
-            plt.grid(True, alpha=0.3)
+        returns = results['returns'].to_numpy()
+        trade_returns = returns[returns != 0.0]
+        if trade_returns.size:
+            bins = np.linspace(trade_returns.min(), trade_returns.max(), 41)
             hist_file = fig_path / f"hist{window_suffix}.png"
-            plt.savefig(hist_file, dpi=300, bbox_inches='tight')
-            plt.close()
+            with save_plot(hist_file, f"Trade Return Histogram (Window: {args.window} days)",
+                           xlabel="Return", ylabel="Frequency") as ax:
+                ax.hist(trade_returns, bins=bins, alpha=0.7)
             print(f"Saved histogram: {hist_file}")
         else:
             print("Warning: No trades to plot in histogram")
         
         # Drawdown plot
-        plt.figure(figsize=(12, 6))
-        drawdown = (results['equity'] / results['equity'].cummax()) - 1
-        drawdown.plot(title=f"Drawdown (Window: {args.window} days)")
-        plt.ylabel("Drawdown")
-        plt.xlabel('Date')
-        plt.grid(True, alpha=0.3)
-        plt.fill_between(drawdown.index, drawdown, 0, alpha=0.3, color='red')
+        drawdown = results['drawdown']
         dd_file = fig_path / f"drawdown{window_suffix}.png"
-        plt.savefig(dd_file, dpi=300, bbox_inches='tight')
-        plt.close()
+        with save_plot(dd_file, f"Drawdown (Window: {args.window} days)",
+                       figsize=(12, 6), xlabel='Date', ylabel="Drawdown") as ax:
+            ax.plot(drawdown)
+            ax.fill_between(drawdown.index, drawdown, 0, alpha=0.3, color='red')
         print(f"Saved drawdown: {dd_file}")
         
         print(f"\nAll plots saved to: {fig_path}")
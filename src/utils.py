@@ -1,68 +1,524 @@
+import os
+import tempfile
 import pandas as pd
 import numpy as np
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
+try:
+    import numba
+except ImportError:  # numba is optional; the NumPy kernel is used instead
+    numba = None
 
-def momentum_backtest(prices, lookback, fee=0.0001):
+HAVE_NUMBA = numba is not None
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+CSV_COLUMNS = ['Date', 'Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume']
+
+
+def load_prices(csv_path=DATA_DIR / "dax_daily.csv"):
+    """
+    Load daily closing prices, caching the parsed CSV as Parquet.
+
+    The first call parses the yfinance CSV and writes ``<name>.parquet``
+    next to it; later calls read the Parquet file instead, until the CSV
+    is modified again. Without pyarrow, or if the data directory is not
+    writable, the CSV is parsed every time; an unreadable cache is
+    ignored and rebuilt from the CSV.
+
+    Parameters:
+    -----------
+    csv_path : str or Path
+        yfinance CSV export (default data/dax_daily.csv)
+
+    Returns:
+    --------
+    tuple : (close prices as float32 ndarray, pd.DatetimeIndex of dates)
+    """
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        raise FileNotFoundError(f"Data file not found: {csv_path}")
+
+    cache_path = csv_path.with_suffix('.parquet')
+    df = None
+    if cache_path.exists() and cache_path.stat().st_mtime >= csv_path.stat().st_mtime:
+        try:
+            df = pd.read_parquet(cache_path, columns=['Date', 'Close'])
+        except (ImportError, OSError, ValueError, KeyError):
+            # Corrupt, truncated or unreadable cache: fall back to the CSV,
+            # which also rewrites the cache below
+            df = None
+
+    if df is None:
+        # Skip yfinance's three header rows (Price / Ticker / Date) and only
+        # parse the two columns we use, with a fixed dtype and date format
+        df = pd.read_csv(
+            csv_path,
+            skiprows=3,
+            names=CSV_COLUMNS,
+            usecols=['Date', 'Close'],
+            dtype={'Close': np.float64},
+            parse_dates=['Date'],
+            date_format='%Y-%m-%d',
+        )
+        df = df.astype({'Close': np.float32})
+
+        # The cache is only an optimisation: write it atomically (so an
+        # interrupted write never leaves a truncated file newer than the
+        # CSV) and carry on with the parsed frame if it cannot be written
+        tmp_path = None
+        try:
+            # A unique temp name, so concurrent loaders never share a file
+            fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, suffix='.parquet')
+            os.close(fd)
+            df.to_parquet(tmp_path, engine='pyarrow', index=False)
+            os.chmod(tmp_path, 0o644)  # mkstemp creates the file owner-only
+            os.replace(tmp_path, cache_path)
+        except (ImportError, OSError):
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    # yfinance closes are stored as float32 upstream, so this is lossless
+    # and halves the bytes every backtest pass has to move
+    return df['Close'].to_numpy(dtype=np.float32), pd.DatetimeIndex(df['Date'])
+
+
+@contextmanager
+def save_plot(path, title, figsize=(10, 6), dpi=300, xlabel=None, ylabel=None):
+    """
+    Yield the axes of a fresh figure, then save it to ``path`` and free it.
+
+    Usage:
+    ------
+    with save_plot(fig_path / "equity.png", "Equity Curve") as ax:
+        ax.plot(equity)
+
+    The figure is drawn on its own Agg canvas rather than through pyplot,
+    so it never touches the caller's backend or pyplot's figure registry,
+    and matplotlib is only imported on first use.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    try:
+        yield ax
+        ax.set_title(title)
+        if xlabel:
+            ax.set_xlabel(xlabel)
+        if ylabel:
+            ax.set_ylabel(ylabel)
+        ax.grid(True, alpha=0.3)
+        fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    finally:
+        fig.clear()
+
+
+@dataclass
+class Scratch:
+    """
+    Work arrays for one backtest over ``n`` prices.
+
+    Passing the same Scratch to repeated ``momentum_backtest`` calls (e.g.
+    across a parameter sweep) avoids reallocating every array per call.
+    The return/signal buffers use the price dtype; equity, peak and
+    drawdown are always float64 since the compounded product drifts.
+    The compiled kernel only writes the last four buffers, so a
+    ``kernel_only`` Scratch leaves the NumPy intermediates as None.
+    """
+    ret: Optional[np.ndarray]
+    rollsum: Optional[np.ndarray]
+    pos: Optional[np.ndarray]
+    trades: Optional[np.ndarray]
+    strategy_ret: np.ndarray
+    equity: np.ndarray
+    peak: np.ndarray
+    drawdown: np.ndarray
+
+    @classmethod
+    def empty(cls, n, dtype=np.float64, kernel_only=False):
+        """
+        Allocate uninitialised buffers for ``n`` prices of ``dtype``.
+
+        With ``kernel_only=True`` only the buffers the compiled ``_bt``
+        kernel writes are allocated; such a Scratch cannot be used with
+        the NumPy kernel.
+        """
+        def scratch(dt):
+            return None if kernel_only else np.empty(n, dtype=dt)
+
+        return cls(
+            ret=scratch(dtype),
+            rollsum=scratch(dtype),
+            pos=scratch(np.int8),
+            trades=scratch(dtype),
+            strategy_ret=np.empty(n, dtype=dtype),
+            equity=np.empty(n),
+            peak=np.empty(n),
+            drawdown=np.empty(n),
+        )
+
+    def __len__(self):
+        return len(self.equity)
+
+
+def _bt_numpy(prices, lookback, fee, out):
+    """
+    Vectorized NumPy backtest kernel, used when numba is not installed.
+
+    Writes every intermediate into the ``out`` Scratch buffers and returns
+    the same tuple as ``_bt``: (equity_last, mean, m2, mdd)
+    """
+    p = prices
+
+    # Calculate returns
+    ret = out.ret
+    ret[0] = 0.0
+    np.divide(p[1:], p[:-1], out=ret[1:])
+    ret[1:] -= 1.0
+    # A missing close makes two returns NaN; count them as flat days,
+    # like the pct_change().fillna(0) this kernel replaced
+    np.nan_to_num(ret, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+
+    # Generate signal: positive if last N days had positive cumulative return.
+    # The window sum is a difference of prefix sums, so O(N) for any lookback.
+    csum = np.cumsum(ret, out=out.rollsum)
+
+    # Position: trade next day, i.e. day i holds the signal of day i - 1
+    pos = out.pos
+    pos[:lookback] = 0
+    pos[lookback] = csum[lookback - 1] > 0
+    np.greater(csum[lookback:-1] - csum[:-lookback - 1], 0, out=pos[lookback + 1:])
+
+    # Strategy returns with transaction costs, pos * ret - fee * |dpos|,
+    # evaluated through the Scratch buffers without any temporaries
+    cost = out.trades
+    cost[0] = 0  # pos[0] is always flat
+    np.subtract(pos[1:], pos[:-1], out=cost[1:])
+    np.abs(cost, out=cost)
+    cost *= fee
+    strategy_ret = np.multiply(pos, ret, out=out.strategy_ret)
+    strategy_ret -= cost
+
+    # Equity curve and maximum drawdown, compounded in float64 log space:
+    # a cumsum of log1p returns instead of a cumprod, with the running peak
+    # and drawdown taken on the log equity before exponentiating
+    log_equity = np.log1p(strategy_ret, out=out.equity, dtype=np.float64)
+    np.cumsum(log_equity, out=log_equity)
+    log_peak = np.maximum.accumulate(log_equity, out=out.peak)
+    drawdown = np.subtract(log_equity, log_peak, out=out.drawdown)
+    np.expm1(drawdown, out=drawdown)
+    equity = np.exp(log_equity, out=log_equity)
+    np.exp(log_peak, out=log_peak)
+    mdd = drawdown.min()
+
+    mean = strategy_ret.mean(dtype=np.float64)
+    m2 = ((strategy_ret - mean) ** 2).sum()
+
+    return equity[-1], mean, m2, mdd
+
+
+def _daily_return(prices, i):
+    """Return of day ``i``: 0 on day one and wherever a close is missing."""
+    if i == 0:
+        return 0.0
+    r = prices[i] / prices[i - 1] - 1.0
+    return r if np.isfinite(r) else 0.0
+
+
+def _bt(prices, lookback, fee, strategy_ret, equity, peak_arr, drawdown):
+    """
+    Single-pass backtest kernel, compiled with numba when available.
+
+    Streams through the prices once, keeping a running window sum of the
+    last ``lookback`` returns, and writes strategy returns, equity,
+    running peak and drawdown into the given arrays in the same loop.
+    The mean and sum of squared deviations (``m2``) of the strategy
+    returns are updated with Welford's online algorithm, so Sharpe needs
+    no extra pass. Prices and strategy returns may be float32 or float64;
+    the loop itself always accumulates in float64.
+
+    Returns:
+    --------
+    tuple : (equity_last, mean, m2, mdd)
+    """
+    n = prices.shape[0]
+
+    window_sum = 0.0
+    signal_prev = 0.0   # yesterday's signal is today's position
+    pos_prev = 0.0
+    eq = 1.0
+    peak = 1.0
+    mdd = 0.0
+    mean = 0.0
+    m2 = 0.0
+
+    for i in range(n):
+        r = _daily_return(prices, i)
+
+        # Trade on yesterday's signal, paying the fee on position changes
+        pos = signal_prev
+        sr = pos * r - fee * abs(pos - pos_prev)
+        strategy_ret[i] = sr
+        delta = sr - mean
+        mean += delta / (i + 1)
+        m2 += delta * (sr - mean)
+
+        eq *= 1.0 + sr
+        equity[i] = eq
+        peak = max(peak, eq)
+        dd = eq / peak - 1.0
+        peak_arr[i] = peak
+        drawdown[i] = dd
+        mdd = min(mdd, dd)
+
+        # Roll the window: add today's return, drop the one leaving it
+        window_sum += r
+        if i >= lookback:
+            window_sum -= _daily_return(prices, i - lookback)
+        signal_prev = 1.0 if i >= lookback - 1 and window_sum > 0 else 0.0
+        pos_prev = pos
+
+    return eq, mean, m2, mdd
+
+
+def _bt_numba(prices, lookback, fee, out):
+    """Run the compiled ``_bt`` kernel against the ``out`` Scratch buffers."""
+    return _bt(prices, lookback, fee, out.strategy_ret, out.equity, out.peak, out.drawdown)
+
+
+def _sweep(prices, lookbacks, fee, equity_last, mean_out, m2_out, mdd_out):
+    """
+    Batch kernel: the ``_bt`` metrics for every window in ``lookbacks``.
+
+    The prefix sums of the returns are computed once and shared by all
+    windows, since the window sum ending at day ``j`` is just
+    ``csum[j] - csum[j - lookback]``. Windows are independent and run in
+    parallel (``numba.prange``). Results are written to the ``*_out``
+    arrays, one entry per lookback.
+    """
+    n = prices.shape[0]
+
+    csum = np.empty(n)
+    acc = 0.0
+    for i in range(1, n):
+        acc += _daily_return(prices, i)
+        csum[i] = acc
+    csum[0] = 0.0
+
+    for k in numba.prange(lookbacks.shape[0]):
+        lookback = lookbacks[k]
+        pos_prev = 0.0
+        eq = 1.0
+        peak = 1.0
+        mdd = 0.0
+        mean = 0.0
+        m2 = 0.0
+
+        for i in range(n):
+            r = _daily_return(prices, i)
+
+            # Today's position is the signal of the window ending yesterday
+            j = i - 1
+            pos = 0.0
+            if j >= lookback - 1:
+                window_sum = csum[j] - (csum[j - lookback] if j >= lookback else 0.0)
+                if window_sum > 0:
+                    pos = 1.0
+
+            sr = pos * r - fee * abs(pos - pos_prev)
+            delta = sr - mean
+            mean += delta / (i + 1)
+            m2 += delta * (sr - mean)
+
+            eq *= 1.0 + sr
+            peak = max(peak, eq)
+            mdd = min(mdd, eq / peak - 1.0)
+            pos_prev = pos
+
+        equity_last[k] = eq
+        mean_out[k] = mean
+        m2_out[k] = m2
+        mdd_out[k] = mdd
+
+
+def _prime_kernel():
+    """
+    Compile ``_bt`` for every argument type it is given.
+
+    With ``cache=True`` this only loads the on-disk cache after the first
+    run, so worker processes in a sweep never JIT inside a backtest.
+    pandas hands out read-only arrays under copy-on-write, which numba
+    types separately from writable ones, so both are primed.
+
+    ``_sweep`` is left to compile on its first call: it runs once per
+    sweep in the calling process, and most imports never use it.
+    """
+    for dtype in (np.float32, np.float64):
+        for writeable in (True, False):
+            prices = np.ones(8, dtype=dtype)
+            prices.flags.writeable = writeable
+            _bt_numba(prices, 3, 0.0, Scratch.empty(8, dtype=dtype, kernel_only=True))
+
+
+if numba is not None:
+    _daily_return = numba.njit(cache=True)(_daily_return)
+    _bt = numba.njit(cache=True)(_bt)
+    # No fastmath here: reassociating the shared prefix-sum differences
+    # flips the sign of exact-zero window sums on flat days
+    _sweep = numba.njit(cache=True, parallel=True)(_sweep)
+    _kernel = _bt_numba
+    _prime_kernel()
+else:
+    _kernel = _bt_numpy
+
+
+def momentum_backtest(prices, lookback, fee=0.0001, *, index=None, out=None):
     """
     Run momentum backtest with specified lookback window and transaction fee.
-    
+
     Parameters:
     -----------
-    prices : pd.Series
-        Price series with datetime index
+    prices : np.ndarray or pd.Series
+        Closing prices. float32 prices are kept in float32 for the
+        return/signal arithmetic; anything else is converted to float64
     lookback : int
         Number of days to look back for momentum signal
     fee : float
         Transaction fee as decimal (default 0.0001 = 1bp)
-        
+    index : pd.Index, optional
+        Dates used to label the returned series for plotting. Defaults to
+        ``prices.index`` when ``prices`` is a Series
+    out : Scratch, optional
+        Preallocated work buffers of the same length as ``prices``. The
+        returned series are views of these buffers, so they are
+        overwritten by the next call that reuses ``out``.
+
     Returns:
     --------
-    dict : Dictionary containing CAGR, Sharpe, MaxDD, and returns series
+    dict : Dictionary containing CAGR, Sharpe, MaxDD, and the returns,
+           equity, running peak and drawdown series. These are Series on
+           ``index`` when one is available, plain ndarrays otherwise
     """
     if lookback <= 0:
         raise ValueError("Lookback window must be positive")
-    
+
     if len(prices) < lookback + 2:
         raise ValueError(f"Not enough data points. Need at least {lookback + 2}, got {len(prices)}")
-    
-    # Calculate returns
-    ret = prices.pct_change().fillna(0)
-    
-    # Generate signal: positive if last N days had positive cumulative return
-    signal = (ret.rolling(lookback).sum() > 0).astype(int)
-    
-    # Position: trade next day (shift signal by 1)
-    pos = signal.shift(1).fillna(0)
-    
-    # Strategy returns with transaction costs
-    strategy_ret = pos * ret - fee * pos.diff().abs().fillna(0)
-    
+
+    # Work on the raw values; pandas is only needed for the index
+    p = np.asarray(prices)
+    if p.dtype != np.float32:
+        p = p.astype(np.float64, copy=False)
+    n = len(p)
+    if out is None:
+        # The compiled kernel never touches the NumPy intermediates
+        out = Scratch.empty(n, dtype=p.dtype, kernel_only=_kernel is _bt_numba)
+    elif out.strategy_ret.dtype != p.dtype:
+        raise ValueError(f"Scratch buffers are {out.strategy_ret.dtype}, prices are {p.dtype}")
+    elif len(out) != n:
+        raise ValueError(f"Scratch buffers hold {len(out)} points, prices have {n}")
+    elif out.ret is None and _kernel is _bt_numpy:
+        raise ValueError("A kernel_only Scratch needs numba; allocate a full Scratch instead")
+
+    equity_last, mean, m2, mdd = _kernel(p, int(lookback), float(fee), out)
+
     # Calculate metrics
     ann = 252  # trading days per year
-    
+
     # Sharpe ratio with error handling
-    if strategy_ret.std() == 0:
+    std = np.sqrt(m2 / (n - 1))
+    if std == 0:
         sharpe = 0.0
     else:
-        sharpe = (strategy_ret.mean() / strategy_ret.std()) * np.sqrt(ann)
-    
-    # Equity curve
-    equity = (1 + strategy_ret).cumprod()
-    
+        sharpe = (mean / std) * np.sqrt(ann)
+
     # CAGR
-    if len(strategy_ret) == 0 or equity.iloc[-1] <= 0:
+    if n == 0 or equity_last <= 0:
         cagr = 0.0
     else:
-        cagr = equity.iloc[-1] ** (ann / len(strategy_ret)) - 1
-    
-    # Maximum drawdown
-    mdd = (equity / equity.cummax() - 1).min()
-    
-    return {
+        cagr = equity_last ** (ann / n) - 1
+
+    results = {
         'cagr': cagr,
         'sharpe': sharpe,
         'max_dd': mdd,
-        'returns': strategy_ret,
-        'equity': equity
-    } 
\ No newline at end of file
+        'returns': out.strategy_ret,
+        'equity': out.equity,
+        'peak': out.peak,
+        'drawdown': out.drawdown
+    }
+
+    # Only the outputs are wrapped into Series, and only for plotting
+    if index is None:
+        index = getattr(prices, 'index', None)
+    if index is not None:
+        for key in ('returns', 'equity', 'peak', 'drawdown'):
+            results[key] = pd.Series(results[key], index=index, copy=False)
+
+    return results
+
+
+def momentum_sweep(prices, lookbacks, fee=0.0001):
+    """
+    Compute momentum_backtest's metrics for many lookback windows at once.
+
+    With numba, a single batch kernel shares the prefix sums of the
+    returns across all windows and runs the windows in parallel threads.
+    Without numba, momentum_backtest is run per window on one reused
+    set of Scratch buffers.
+
+    Parameters:
+    -----------
+    prices : pd.Series or np.ndarray
+        Price series (see momentum_backtest)
+    lookbacks : sequence of int
+        Lookback windows to evaluate
+    fee : float
+        Transaction fee as decimal (default 0.0001 = 1bp)
+
+    Returns:
+    --------
+    tuple : (sharpes, cagrs, max_dds) arrays, one entry per lookback
+    """
+    lookbacks = np.asarray(lookbacks, dtype=np.int64)
+    if lookbacks.size == 0:
+        empty = np.empty(0)
+        return empty, empty.copy(), empty.copy()
+
+    if lookbacks.min() <= 0:
+        raise ValueError("Lookback window must be positive")
+
+    if len(prices) < lookbacks.max() + 2:
+        raise ValueError(f"Not enough data points. Need at least {lookbacks.max() + 2}, got {len(prices)}")
+
+    p = np.asarray(prices)
+    if p.dtype != np.float32:
+        p = p.astype(np.float64, copy=False)
+
+    if numba is None:
+        out = Scratch.empty(len(p), dtype=p.dtype)
+        results = [momentum_backtest(p, lookback, fee, out=out) for lookback in lookbacks]
+        return (np.array([r['sharpe'] for r in results]),
+                np.array([r['cagr'] for r in results]),
+                np.array([r['max_dd'] for r in results]))
+
+    n = len(p)
+    k = len(lookbacks)
+    equity_last, mean, m2, mdd = np.empty(k), np.empty(k), np.empty(k), np.empty(k)
+    _sweep(p, lookbacks, float(fee), equity_last, mean, m2, mdd)
+
+    # Same metric definitions as momentum_backtest, vectorized over windows
+    ann = 252  # trading days per year
+    std = np.sqrt(m2 / (n - 1))
+    sharpe = np.divide(mean, std, out=np.zeros(k), where=std != 0) * np.sqrt(ann)
+    cagr = np.where(equity_last > 0, np.maximum(equity_last, 0) ** (ann / n) - 1, 0.0)
+
+    return sharpe, cagr, mdd
\ No newline at end of file
@@ -4,9 +4,9 @@ Vectorbt-powered momentum backtest with professional portfolio statistics.
 Falls back gracefully if vectorbt is not installed.
 """
 
+import os
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
 import sys
 
@@ -25,17 +25,16 @@ def main():
 
     try:
         # Load data
-        data_path = Path(__file__).parent.parent / "data" / "dax_daily.csv"
-        if not data_path.exists():
-            print(f"Error: Data file not found: {data_path}")
-            sys.exit(1)
+        sys.path.append(str(Path(__file__).parent))
+        from utils import load_prices
         
-        print(f"Loading data from {data_path}")
-        # Read CSV with proper column names, skipping the metadata rows
-        df = pd.read_csv(data_path, skiprows=3, names=['Date', 'Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume'])
-        df['Date'] = pd.to_datetime(df['Date'])
-        df.set_index('Date', inplace=True)
-        prices = df['Close']
+        try:
+            close, dates = load_prices()
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        # load_prices stores float32; vectorbt and the benchmark compound in float64
+        prices = pd.Series(close.astype(np.float64), index=dates)
         
         print(f"Loaded {len(prices)} price points from {prices.index[0].strftime('%Y-%m-%d')} to {prices.index[-1].strftime('%Y-%m-%d')}")
         
@@ -44,7 +43,16 @@ def main():
         
         # Generate momentum signal: 3-day rolling sum > 0
         lookback = 3
-        momentum_sum = returns.rolling(lookback).sum()
+        try:
+            import bottleneck as bn
+        except ImportError:
+            momentum_sum = returns.rolling(lookback).sum()
+        else:
+            # C-level O(N) moving sum; leading NaNs match pandas' rolling
+            momentum_sum = pd.Series(
+                bn.move_sum(returns.to_numpy(), window=lookback),
+                index=returns.index
+            )
         
         # Create entry signals (when momentum turns positive)
         entries = (momentum_sum > 0) & (momentum_sum.shift(1) <= 0)
@@ -74,11 +82,11 @@ def main():
         
         # Method 2: Using from_signals with cleaner entry/exit logic
         # Create proper entry and exit signals
-        # Entry: when we want to be long but aren't already long
-        entries = long_signals & ~long_signals.shift(1).fillna(False)
-        
-        # Exit: when we want to be out but are currently long
-        exits = ~long_signals & long_signals.shift(1).fillna(False)
+        # One integer diff gives both edges: +1 when we go long while not
+        # already long (entry), -1 when we drop out of a long (exit)
+        edges = np.diff(long_signals.to_numpy().astype(np.int8), prepend=0)
+        entries = pd.Series(edges == 1, index=prices.index)
+        exits = pd.Series(edges == -1, index=prices.index)
         
         # Create portfolio using signal-based approach
         portfolio = vbt.Portfolio.from_signals(
@@ -133,6 +141,7 @@ def main():
         fig_path.mkdir(exist_ok=True)
         
         # Vectorbt has beautiful built-in plotting
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(14, 8))
         
         # Plot equity curve with benchmark
@@ -198,17 +207,13 @@ def run_fallback_analysis():
     try:
         # Import our utility function
         sys.path.append(str(Path(__file__).parent))
-        from utils import momentum_backtest
+        from utils import load_prices, momentum_backtest, save_plot
         
         # Load data
-        data_path = Path(__file__).parent.parent / "data" / "dax_daily.csv"
-        df = pd.read_csv(data_path, skiprows=3, names=['Date', 'Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume'])
-        df['Date'] = pd.to_datetime(df['Date'])
-        df.set_index('Date', inplace=True)
-        prices = df['Close']
+        close, dates = load_prices()
         
         print("Running basic momentum backtest (fallback mode)...")
-        results = momentum_backtest(prices, lookback=3, fee=0.0001)
+        results = momentum_backtest(close, lookback=3, fee=0.0001, index=dates)
         
         print(f"\n{'='*50}")
         print("BASIC BACKTEST RESULTS")
@@ -221,12 +226,9 @@ def run_fallback_analysis():
         fig_path = Path(__file__).parent.parent / "fig"
         fig_path.mkdir(exist_ok=True)
         
-        plt.figure(figsize=(10, 6))
-        results['equity'].plot(title="Equity Curve (Fallback Mode)")
-        plt.grid(True, alpha=0.3)
         equity_file = fig_path / "vbt_equity.png"
-        plt.savefig(equity_file, dpi=300, bbox_inches='tight')
-        plt.close()
+        with save_plot(equity_file, "Equity Curve (Fallback Mode)") as ax:
+            ax.plot(results['equity'])
         
         print(f"✅ Basic equity curve saved: {equity_file}")
         
@@ -235,4 +237,6 @@ def run_fallback_analysis():
 
 
 if __name__ == "__main__":
+    # Plots are only written to files; leave an explicit MPLBACKEND alone
+    os.environ.setdefault("MPLBACKEND", "Agg")
     main() 
\ No newline at end of file